@@ -10,6 +10,7 @@ from app_modules import logger
 from app_modules import utils
 from app_modules import camera_handler
 from app_modules import supabase_handler
+from app_modules import diagnostics
 
 try:
     from worker import hdg
@@ -29,6 +30,10 @@ def take_and_upload_screenshot(mac_address: str):
         logger.log_message("CAMERA_RTSP_URL not configured in .env. Skipping screenshot.")
         return
 
+    if diagnostics.is_shedding():
+        logger.log_message("Memory ceiling exceeded. Skipping screenshot to free resources.")
+        return
+
     # Check if we already took a screenshot this hour to avoid duplicates
     now = datetime.datetime.now()
     current_hour = now.hour
@@ -1,4 +1,5 @@
 # app_modules/config.py
+import math
 import os
 from dotenv import load_dotenv
 
@@ -7,6 +8,24 @@ from dotenv import load_dotenv
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+def _env_number(name, default, cast=int, minimum=None, maximum=None):
+    """Reads a numeric environment variable, falling back to default if unset, invalid or out of range."""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        number = cast(value)
+        if not math.isfinite(number):
+            raise ValueError(f"non-finite value {value}")
+    except ValueError:
+        print(f"WARNING: Invalid value for {name}: '{value}'. Using default {default}.")
+        return default
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        bounds = f"{minimum} to {maximum}" if maximum is not None else f">= {minimum}"
+        print(f"WARNING: {name}={value} is out of range ({bounds}). Using default {default}.")
+        return default
+    return number
+
 # --- Environment Variables ---
 HDGIP1 = os.getenv('HDGIP1')
 HDGIP2 = os.getenv('HDGIP2')
@@ -28,6 +47,15 @@ HDG_SOURCES = [
 # Hours of the day (0-23) to take screenshots (e.g., Midnight, Noon)
 SCREENSHOT_HOURS = [0, 12]
 
+# --- Diagnostics (all optional; 0 disables DIAG_PORT, DIAG_TRACEMALLOC_FRAMES and MEMORY_LIMIT_MB) ---
+DIAG_PORT = _env_number('DIAG_PORT', 0, minimum=0, maximum=65535) # Local HTTP diagnostics endpoint on 127.0.0.1
+DIAG_PROFILE_SECONDS = _env_number('DIAG_PROFILE_SECONDS', 30, float, minimum=0.1, maximum=600) # Default wall-clock profile length (SIGUSR2)
+DIAG_PROFILE_INTERVAL_SECONDS = 0.01 # Sampling interval of the wall-clock profiler
+DIAG_TRACEMALLOC_FRAMES = _env_number('DIAG_TRACEMALLOC_FRAMES', 0, minimum=0, maximum=65535) # >0 starts tracemalloc at startup
+MEMORY_LIMIT_MB = _env_number('MEMORY_LIMIT_MB', 0, minimum=0) # RSS ceiling; above it optional work is shed
+MEMORY_CHECK_INTERVAL_SECONDS = _env_number('MEMORY_CHECK_INTERVAL_SECONDS', 60, minimum=1, maximum=86400) # At most once a day
+MEMORY_RESUME_RATIO = 0.9 # Resume optional work once RSS drops below this fraction of the limit
+
 # --- Validation ---
 def check_essential_config():
     """Checks if essential configuration variables are set."""
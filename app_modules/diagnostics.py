@@ -0,0 +1,285 @@
+# app_modules/diagnostics.py
+# On-demand diagnostics for the long-running process: thread dumps, a sampling
+# wall-clock profiler, tracemalloc snapshots and a memory ceiling guard.
+# Triggered via signals (SIGUSR1/SIGUSR2) or a small HTTP endpoint on localhost.
+import collections
+import gc
+import math
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+# Use relative imports for modules in the same package
+from . import config
+from . import logger
+
+_shedding = threading.Event()  # Set while over the memory ceiling; optional work should skip
+_profile_lock = threading.Lock()  # Only one profile at a time
+_THREAD_PREFIX = "diagnostics-"  # Threads owned by this module; skipped by the profiler
+_snapshot_lock = threading.Lock()
+_last_snapshot: tracemalloc.Snapshot | None = None
+_started = False
+
+# --- Thread dumps ---
+
+def dump_threads() -> str:
+    """Returns the current stack of every thread as text."""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    lines = []
+    for ident, frame in sys._current_frames().items():
+        lines.append(f"--- Thread {names.get(ident, 'unknown')} (id={ident}) ---")
+        lines.extend(line.rstrip("\n") for line in traceback.format_stack(frame))
+    return "\n".join(lines)
+
+# --- Sampling wall-clock profiler ---
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+def profile_wall_clock(seconds: float, interval: float | None = None, top: int = 25) -> str:
+    """Samples the stacks of all application threads for `seconds` and returns where they spent wall-clock time.
+
+    Threads blocked in sleep or I/O are counted too; the diagnostics module's own threads are skipped.
+    """
+    interval = interval or config.DIAG_PROFILE_INTERVAL_SECONDS
+    if not _profile_lock.acquire(blocking=False):
+        return "A profile is already running. Try again later."
+    try:
+        own_ident = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        self_counts = collections.Counter()   # innermost frame only
+        total_counts = collections.Counter()  # any frame on the stack
+        stack_counts = collections.Counter()  # full stacks, outermost first
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                thread_name = names.get(ident, str(ident))
+                if ident == own_ident or thread_name.startswith(_THREAD_PREFIX):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_key(frame))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                self_counts[stack[0]] += 1
+                for key in set(stack):
+                    total_counts[key] += 1
+                stack_counts[";".join([thread_name] + stack[::-1])] += 1
+            samples += 1
+            time.sleep(interval)
+
+        if not samples:
+            return "No samples collected."
+        lines = [f"Wall-clock profile: {samples} samples over {seconds}s (interval {interval}s, idle waits included)"]
+        lines.append(f"Top {top} frames by wall-clock samples (innermost frame):")
+        for key, count in self_counts.most_common(top):
+            lines.append(f"  {count:6d} self  {total_counts[key]:6d} total  {key}")
+        lines.append(f"Top {top} wall-clock stacks (collapsed):")
+        for stack, count in stack_counts.most_common(top):
+            lines.append(f"  {count:6d}  {stack}")
+        return "\n".join(lines)
+    finally:
+        _profile_lock.release()
+
+# --- tracemalloc snapshots ---
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+def _format_snapshot(snapshot: tracemalloc.Snapshot, baseline: tracemalloc.Snapshot | None, top: int) -> str:
+    traced, peak = tracemalloc.get_traced_memory()
+    lines = [f"RSS: {_format_mb(get_rss_mb())} | traced by Python: {traced / 1024 / 1024:.1f} MB (peak {peak / 1024 / 1024:.1f} MB)"]
+    if baseline is not None:
+        lines.append(f"Top {top} allocation changes since previous snapshot:")
+        lines.extend(f"  {stat}" for stat in snapshot.compare_to(baseline, "lineno")[:top])
+    else:
+        lines.append(f"Top {top} allocations:")
+        lines.extend(f"  {stat}" for stat in snapshot.statistics("lineno")[:top])
+    return "\n".join(lines)
+
+def memory_snapshot(diff: bool = False, top: int = 25, start_tracing: bool = True) -> str:
+    """Takes a tracemalloc snapshot and returns the top allocations, or the diff to the previous snapshot.
+
+    If tracemalloc is not running it is started (and stays on until stop_tracing()) when
+    start_tracing is True; otherwise live object counts by type are returned instead.
+    """
+    global _last_snapshot
+    with _snapshot_lock:
+        if not tracemalloc.is_tracing():
+            if not start_tracing:
+                return "tracemalloc is not running. Top live object types:\n" + _top_object_types()
+            tracemalloc.start(max(1, config.DIAG_TRACEMALLOC_FRAMES))
+            _last_snapshot = _take_snapshot()
+            return "tracemalloc was not running. Tracing started now (stop with /memory/stop); baseline snapshot taken, request again later."
+
+        snapshot = _take_snapshot()
+        report = _format_snapshot(snapshot, _last_snapshot if diff else None, top)
+        _last_snapshot = snapshot
+        return report
+
+def stop_tracing() -> str:
+    """Stops tracemalloc and drops the stored baseline snapshot."""
+    global _last_snapshot
+    with _snapshot_lock:
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is not running."
+        tracemalloc.stop()
+        _last_snapshot = None
+        return "tracemalloc stopped."
+
+# --- Memory ceiling guard ---
+
+def get_rss_mb() -> float | None:
+    """Returns the current resident set size in MB, or None if it cannot be read."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024  # Value is in kB
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _format_mb(value: float | None) -> str:
+    return "unknown" if value is None else f"{value:.1f} MB"
+
+def is_shedding() -> bool:
+    """True while the process is above its memory ceiling and optional work should be skipped."""
+    return _shedding.is_set()
+
+def _top_object_types(top: int = 15) -> str:
+    """Fallback offender report when tracemalloc is not running: live object counts by type."""
+    counts = collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+    return "\n".join(f"  {count:8d}  {name}" for name, count in counts.most_common(top))
+
+def _report_offenders() -> str:
+    # Uses a local snapshot so the operator's baseline for /memory/diff is left untouched
+    if tracemalloc.is_tracing():
+        return _format_snapshot(_take_snapshot(), None, 15)
+    return "Top live object types (set DIAG_TRACEMALLOC_FRAMES for allocation sites):\n" + _top_object_types()
+
+def check_memory() -> None:
+    """Compares RSS to the ceiling, logs offenders and toggles load shedding."""
+    limit = config.MEMORY_LIMIT_MB
+    rss = get_rss_mb()
+    if not limit or rss is None:
+        return
+
+    if rss >= limit:
+        if not _shedding.is_set():
+            _shedding.set()
+            logger.log_error(f"Memory ceiling exceeded: RSS {rss:.1f} MB >= {limit} MB. Shedding optional work (camera capture).\n{_report_offenders()}", include_traceback=False)
+        gc.collect()
+    elif _shedding.is_set() and rss < limit * config.MEMORY_RESUME_RATIO:
+        _shedding.clear()
+        logger.log_message(f"Memory back to {rss:.1f} MB (limit {limit} MB). Resuming optional work.")
+
+def _memory_guard_worker():
+    logger.log_message(f"Memory guard started (limit {config.MEMORY_LIMIT_MB} MB, every {config.MEMORY_CHECK_INTERVAL_SECONDS}s).")
+    while True:
+        try:
+            check_memory()
+        except Exception as e:
+            logger.log_error(f"Memory guard check failed: {e}", include_traceback=True)
+        time.sleep(config.MEMORY_CHECK_INTERVAL_SECONDS)
+
+# --- Triggers: signals and local HTTP endpoint ---
+
+def _run_and_log(title: str, func, *args):
+    try:
+        logger.log_message(f"{title}:\n{func(*args)}")
+    except Exception as e:
+        logger.log_error(f"Diagnostics '{title}' failed: {e}", include_traceback=True)
+
+def _handle_sigusr1(signum, frame):
+    # Run outside the signal handler so the main loop is not blocked
+    threading.Thread(target=_run_and_log, args=("Thread dump", dump_threads), name=f"{_THREAD_PREFIX}threads", daemon=True).start()
+    threading.Thread(target=_run_and_log, args=("Memory snapshot", memory_snapshot, True, 25, False), name=f"{_THREAD_PREFIX}memory", daemon=True).start()
+
+def _handle_sigusr2(signum, frame):
+    seconds = config.DIAG_PROFILE_SECONDS
+    threading.Thread(target=_run_and_log, args=(f"Wall-clock profile ({seconds}s)", profile_wall_clock, seconds), name=f"{_THREAD_PREFIX}profile", daemon=True).start()
+
+class _DiagnosticsHandler(BaseHTTPRequestHandler):
+    """Serves plain-text diagnostics: /threads, /profile?seconds=N, /memory, /memory/diff, /memory/stop."""
+
+    def do_GET(self):
+        threading.current_thread().name = f"{_THREAD_PREFIX}request"
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/threads":
+                body = dump_threads()
+            elif url.path == "/profile":
+                try:
+                    seconds = float(params.get("seconds", [config.DIAG_PROFILE_SECONDS])[0])
+                    if not math.isfinite(seconds):
+                        raise ValueError(f"seconds must be a finite number, got {seconds}")
+                except ValueError as e:
+                    self._send(400, f"Bad request: {e}\n")
+                    return
+                body = profile_wall_clock(min(max(seconds, 0.1), 600))
+            elif url.path == "/memory":
+                body = memory_snapshot(diff=False)
+            elif url.path == "/memory/diff":
+                body = memory_snapshot(diff=True)
+            elif url.path == "/memory/stop":
+                body = stop_tracing()
+            else:
+                self._send(404, "Available: /threads, /profile?seconds=N, /memory, /memory/diff, /memory/stop\n")
+                return
+        except Exception as e:
+            logger.log_error(f"Diagnostics endpoint error on {url.path}: {e}", include_traceback=True)
+            self._send(500, f"Error: {e}\n")
+            return
+        self._send(200, body + "\n")
+
+    def _send(self, status: int, body: str):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.log_message(f"Diagnostics request: {format % args}")
+
+def start_diagnostics():
+    """Installs signal handlers and starts the memory guard and diagnostics endpoint as configured."""
+    global _started
+    if _started:
+        return
+    _started = True
+
+    if config.DIAG_TRACEMALLOC_FRAMES > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(config.DIAG_TRACEMALLOC_FRAMES)
+        logger.log_message(f"tracemalloc started ({config.DIAG_TRACEMALLOC_FRAMES} frames).")
+
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _handle_sigusr1)
+        signal.signal(signal.SIGUSR2, _handle_sigusr2)
+        logger.log_message("Diagnostics signals installed (SIGUSR1: threads + memory, SIGUSR2: wall-clock profile).")
+
+    if config.MEMORY_LIMIT_MB > 0:
+        threading.Thread(target=_memory_guard_worker, name=f"{_THREAD_PREFIX}memory-guard", daemon=True).start()
+
+    if config.DIAG_PORT > 0:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", config.DIAG_PORT), _DiagnosticsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"{_THREAD_PREFIX}http", daemon=True).start()
+            logger.log_message(f"Diagnostics endpoint listening on http://127.0.0.1:{config.DIAG_PORT}")
+        except OSError as e:
+            logger.log_error(f"Could not start diagnostics endpoint on port {config.DIAG_PORT}: {e}", include_traceback=False)
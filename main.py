@@ -3,7 +3,7 @@ import datetime
 import sys
 import threading
 
-from app_modules import config, logger, utils, camera_handler, supabase_handler
+from app_modules import config, logger, utils, camera_handler, supabase_handler, diagnostics
 
 try:
     from worker import hdg
@@ -49,14 +49,21 @@ def process_hdg_source(source_config, query_id, mac_address):
 def screenshot_worker(mac_address):
     logger.log_message("Screenshot thread started.")
     taken_today = {8: None, 20: None}
+    deferred_slot = None
 
     while True:
         now = datetime.datetime.now()
         if now.hour in taken_today:
             if taken_today[now.hour] != now.date():
-                logger.log_message(f"Taking scheduled screenshot for {now.hour}:00.")
-                camera_handler.take_and_upload_screenshot(mac_address)
-                taken_today[now.hour] = now.date()
+                if diagnostics.is_shedding():
+                    # Keep the slot open and retry every minute until the hour is over
+                    if deferred_slot != (now.date(), now.hour):
+                        logger.log_message(f"Memory ceiling exceeded. Deferring {now.hour}:00 screenshot until memory recovers.")
+                        deferred_slot = (now.date(), now.hour)
+                else:
+                    logger.log_message(f"Taking scheduled screenshot for {now.hour}:00.")
+                    camera_handler.take_and_upload_screenshot(mac_address)
+                    taken_today[now.hour] = now.date()
         time.sleep(60)  # check every minute
 
 
@@ -70,6 +77,8 @@ def main_loop():
         logger.log_error(f"Config error: {e}", include_traceback=False)
         sys.exit("Missing essential config.")
 
+    diagnostics.start_diagnostics()
+
     mac_address = utils.get_mac_address()
     logger.log_message(f"MAC Address: {mac_address}")
 